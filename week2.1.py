@@ -1,7 +1,36 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import openpyxl
+import io
+import zipfile
+from xml.etree.ElementTree import ParseError
 from pathlib import Path
-import os
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Errors a bad or unreadable workbook can raise; extended by the optional engines below
+# (KeyError: openpyxl on a zip that isn't a workbook; ParseError: a workbook with corrupt XML;
+#  ValueError/TypeError: cell values it can't store)
+READ_ERRORS = (OSError, ValueError, KeyError, ParseError, zipfile.BadZipFile, InvalidFileException)
+WRITE_ERRORS = (OSError, ValueError, TypeError)
+
+EXCEL_READ_ENGINE = "openpyxl"
+# pandas only knows engine="calamine" from 2.2 on
+if tuple(int(v) for v in pd.__version__.split(".")[:2]) >= (2, 2):
+    try:
+        from python_calamine import CalamineError  # Rust-backed reader used by pandas
+        EXCEL_READ_ENGINE = "calamine"
+        READ_ERRORS += (CalamineError,)
+    except ImportError:
+        pass
+
+try:
+    import xlsxwriter  # row-streaming writer, faster than openpyxl
+    from xlsxwriter.exceptions import XlsxWriterException
+    EXCEL_WRITE_ENGINE = "xlsxwriter"
+    WRITE_ERRORS += (XlsxWriterException,)
+except ImportError:
+    EXCEL_WRITE_ENGINE = "openpyxl"
 
 # ========= Page Setup =========
 st.set_page_config(page_title="Excel Manager — Bushra Abu Hani", layout="wide", page_icon="📊")
@@ -53,24 +82,107 @@ DATA_FOLDER = Path("All Data - Bushra Abu Hani")
 DATA_FOLDER.mkdir(parents=True, exist_ok=True)
 
 # ========= Helper Functions =========
+@st.cache_data(ttl=5)
+def _list_excel_files(folder_str: str, mtime: float):
+    # Character classes keep the match case-insensitive like the old endswith check
+    return sorted(p.name for p in Path(folder_str).glob("*.[xX][lL][sS][xX]"))
+
 def list_excel_files(folder: Path):
-    return sorted([f for f in os.listdir(folder) if f.lower().endswith(".xlsx")])
+    return _list_excel_files(str(folder), folder.stat().st_mtime)
+
+@st.cache_data(ttl="10m", max_entries=32)
+def _cached_read_excel(path_str: str, mtime: float) -> pd.DataFrame:
+    # mtime is part of the cache key so edits on disk invalidate the entry
+    # pandas already opens openpyxl workbooks with read_only=True, data_only=True
+    return pd.read_excel(path_str, engine=EXCEL_READ_ENGINE)
 
 def safe_read_excel(path: Path) -> pd.DataFrame:
     if not path.exists() or path.stat().st_size == 0:
         return pd.DataFrame()
     try:
-        return pd.read_excel(path)
-    except Exception as e:
+        return _cached_read_excel(str(path), path.stat().st_mtime)
+    except READ_ERRORS as e:
         st.warning(f"Failed to read file: {e}")
         return pd.DataFrame()
 
-def safe_write_excel(path: Path, df: pd.DataFrame):
+def safe_write_excel(path: Path, df: pd.DataFrame) -> bool:
     try:
-        df.to_excel(path, index=False)
+        header = [str(c) for c in df.columns]
+        # Blank cells must be None, both writers would otherwise see NaN/NaT as values
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        if EXCEL_WRITE_ENGINE == "xlsxwriter":
+            # constant_memory drops writes to already-flushed rows, so rows must go out strictly in order
+            wb = xlsxwriter.Workbook(str(path), {"constant_memory": True,
+                                                 "default_date_format": "yyyy-mm-dd hh:mm:ss"})
+            ws = wb.add_worksheet("Sheet1")
+            ws.write_row(0, 0, header)
+            for r, row in enumerate(rows, start=1):
+                ws.write_row(r, 0, row)
+            wb.close()
+        else:
+            # Stream rows through a write-only workbook instead of df.to_excel
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Sheet1")
+            ws.append(header)
+            for row in rows:
+                ws.append(row)
+            wb.save(path)
         st.toast("Saved successfully ✅", icon="✅")
-    except Exception as e:
+        return True
+    except WRITE_ERRORS as e:
         st.error(f"Failed to save: {e}")
+        return False
+
+def restore_dtypes(num_cols, edited_df: pd.DataFrame) -> pd.DataFrame:
+    # One to_numeric dispatch over all numeric columns; integral floats shrink back to ints
+    if num_cols:
+        edited_df[num_cols] = edited_df[num_cols].apply(pd.to_numeric, errors="coerce", downcast="integer")
+    return edited_df
+
+def column_kind(series: pd.Series):
+    # Editor column type the data is compatible with; None leaves the type to Streamlit
+    if pd.api.types.is_bool_dtype(series):
+        return "checkbox"
+    if pd.api.types.is_numeric_dtype(series):
+        return "number"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred in ("string", "empty"):
+        return "text"
+    return {"boolean": "checkbox", "date": "date", "datetime": "datetime"}.get(inferred)
+
+@st.cache_resource(max_entries=64)
+def _column_config(cols: tuple):
+    # Column configs are never mutated, so one dict per (name, kind) layout is shared across reruns
+    columns = {
+        "number": st.column_config.NumberColumn,
+        "checkbox": st.column_config.CheckboxColumn,
+        "datetime": st.column_config.DatetimeColumn,
+        "date": st.column_config.DateColumn,
+        "text": st.column_config.TextColumn,
+    }
+    return {col: columns.get(kind, st.column_config.Column)(label=col) for col, kind in cols}
+
+def stage_changes(path: Path, df: pd.DataFrame):
+    # Keep structural edits in memory, one frame per file; the file is only rewritten by "Save Table"
+    st.session_state.setdefault("pending", {})[str(path)] = df
+
+def pending_changes(path: Path):
+    return st.session_state.get("pending", {}).get(str(path))
+
+def clear_pending(path: Path):
+    st.session_state.get("pending", {}).pop(str(path), None)
+
+@st.cache_resource
+def _header_only_xlsx(cols: tuple) -> bytes:
+    # An empty workbook with just a header row; built once, then written as raw bytes
+    buf = io.BytesIO()
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(list(cols))
+    wb.save(buf)
+    return buf.getvalue()
 
 def create_excel(path: Path):
     if path.exists():
@@ -93,6 +205,7 @@ with st.sidebar:
             st.warning("Add the .xlsx extension.")
         else:
             create_excel(DATA_FOLDER / new_name)
+            _list_excel_files.clear()
             st.rerun()
 
     st.markdown("---")
@@ -101,20 +214,33 @@ with st.sidebar:
         confirm_del = st.checkbox("Confirm deletion")
         if st.button("Delete Selected File", disabled=not confirm_del, use_container_width=True):
             try:
-                os.remove(DATA_FOLDER / current_file)
+                (DATA_FOLDER / current_file).unlink(missing_ok=True)
+                clear_pending(DATA_FOLDER / current_file)
+                _list_excel_files.clear()
                 st.toast("File deleted 🗑️", icon="🗑️")
                 st.rerun()
-            except Exception as e:
+            except OSError as e:
                 st.error(f"Failed to delete file: {e}")
 
 # ========= Main =========
 if current_file != "— None —":
     path = DATA_FOLDER / current_file
     st.markdown(f"#### 🗃️ Current File: `{current_file}`")
-    df = safe_read_excel(path)
+    # Reuse the frame already in memory unless the file changed on disk
+    df_key = (str(path), path.stat().st_mtime if path.exists() else None)
+    if st.session_state.get("_df_key") != df_key:
+        st.session_state["_df"] = safe_read_excel(path)
+        st.session_state["_df_key"] = df_key
+    df = st.session_state["_df"]
+    pending = pending_changes(path)
+    if pending is not None:
+        df = pending
+        st.info("You have unsaved changes — click 💾 Save Table to write them to the file.")
 
     # Remove old Name/Row Name columns if exist
-    df = df[[c for c in df.columns if c.lower() not in ["name", "row name"]]]
+    drop = [c for c in df.columns if c.lower() in ("name", "row name")]
+    if drop:
+        df = df.drop(columns=drop)
 
     # --- Column & Row Management ---
     with st.container():
@@ -134,14 +260,20 @@ if current_file != "— None —":
                     col_name = f"Column_{len(df.columns)+1}"
                 col_names.append(col_name)
             if st.button("Add Columns", use_container_width=True):
+                existing = set(df.columns)
+                new_cols = []
                 for name in col_names:
                     original_name = name
                     k = 2
-                    while name in df.columns:
+                    while name in existing:
                         name = f"{original_name}_{k}"
                         k += 1
-                    df[name] = None
-                safe_write_excel(path, df)
+                    existing.add(name)
+                    new_cols.append(name)
+                # One concat instead of inserting the new columns one by one
+                blanks = pd.DataFrame({n: pd.Series(dtype="object") for n in new_cols}, index=df.index)
+                df = pd.concat([df, blanks], axis=1)
+                stage_changes(path, df)
                 st.balloons()
                 st.rerun()
 
@@ -151,7 +283,7 @@ if current_file != "— None —":
             cols_to_drop = st.multiselect("Select columns to delete", options=list(df.columns))
             if st.button("Delete Selected Columns", use_container_width=True, disabled=len(cols_to_drop)==0):
                 df = df.drop(columns=cols_to_drop, errors="ignore")
-                safe_write_excel(path, df)
+                stage_changes(path, df)
                 st.toast("Columns deleted 🗑️", icon="🗑️")
                 st.rerun()
 
@@ -160,33 +292,33 @@ if current_file != "— None —":
             st.write("➕ Add Rows")
             nrows = st.number_input("Number of Rows", min_value=1, max_value=50, value=1, step=1)
             if st.button("Add Rows", use_container_width=True):
-                blanks = pd.DataFrame([{c: None for c in df.columns} for _ in range(nrows)])
-                df = pd.concat([df, blanks], ignore_index=True)
-                safe_write_excel(path, df)
+                # Grow the frame in place of building and concatenating blank rows
+                df = df.reset_index(drop=True).reindex(range(len(df) + nrows))
+                stage_changes(path, df)
                 st.balloons()
                 st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
 
     # --- Editable Table ---
     st.markdown("### ✏️ Editable Table")
-    original_dtypes = df.dtypes.to_dict()
-    df_editable = df.astype(str)
+    # Column kinds are rescanned only when the file, its columns or their dtypes change
+    col_kinds_key = (*df_key, tuple(df.columns), tuple(df.dtypes))
+    if st.session_state.get("_col_kinds_key") != col_kinds_key:
+        st.session_state["_col_kinds"] = tuple((c, column_kind(df[c])) for c in df.columns)
+        st.session_state["_col_kinds_key"] = col_kinds_key
+    col_kinds = st.session_state["_col_kinds"]
+    num_cols = [c for c, kind in col_kinds if kind == "number"]
 
+    # Edit the frame with its native dtypes instead of a string copy
     edited_df = st.data_editor(
-        df_editable,
+        df,
         hide_index=True,
         use_container_width=True,
         num_rows="dynamic",
         key="editor",
-        column_config={col: st.column_config.TextColumn(label=col) for col in df_editable.columns}
+        column_config=_column_config(col_kinds)
     )
 
-    def restore_dtypes(original_dtypes, edited_df):
-        for col, dtype in original_dtypes.items():
-            if pd.api.types.is_numeric_dtype(dtype):
-                edited_df[col] = pd.to_numeric(edited_df[col], errors='coerce')
-        return edited_df
-
     # --- Action Buttons ---
     st.markdown('<div class="card fadein">', unsafe_allow_html=True)
     s1, s2, s3 = st.columns([1,1,1])
@@ -194,9 +326,11 @@ if current_file != "— None —":
     # Save table
     with s1:
         if st.button("💾 Save Table", use_container_width=True):
-            edited_df_to_save = restore_dtypes(original_dtypes, edited_df)
-            safe_write_excel(path, edited_df_to_save)
-            st.balloons()
+            # Staged edits are only dropped once they are safely on disk
+            if safe_write_excel(path, restore_dtypes(num_cols, edited_df)):
+                clear_pending(path)
+                st.balloons()
+                st.rerun()
 
     # Delete rows
     with s2:
@@ -207,8 +341,10 @@ if current_file != "— None —":
                 format_func=lambda x: f"Row {x+1}"
             )
             if st.button("🗑️ Delete Selected Rows", disabled=len(rows_to_delete)==0, use_container_width=True):
-                new_df = edited_df.drop(index=rows_to_delete).reset_index(drop=True)
-                safe_write_excel(path, new_df)
+                keep = np.ones(len(edited_df), dtype=bool)
+                keep[rows_to_delete] = False
+                new_df = edited_df.iloc[keep].reset_index(drop=True)
+                stage_changes(path, new_df)
                 st.toast("Rows deleted 🗑️", icon="🗑️")
                 st.balloons()
                 st.rerun()
@@ -216,6 +352,8 @@ if current_file != "— None —":
     # Reload
     with s3:
         if st.button("⟲ Reload Table", use_container_width=True):
+            # Reloading discards unsaved changes and shows the file as it is on disk
+            clear_pending(path)
             st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -231,8 +369,8 @@ with st.expander("🏭 Create 'Warehouse Number One' File"):
         if path.exists():
             st.warning("File already exists.")
         else:
-            df = pd.DataFrame(columns=cols)
-            df.to_excel(path, index=False)
+            path.write_bytes(_header_only_xlsx(tuple(cols)))
+            _list_excel_files.clear()
             st.success("File created ✅")
             st.balloons()
 